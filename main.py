@@ -10,12 +10,17 @@
 import os
 import asyncio
 import logging
-import io
 import tempfile
 import datetime
 import hashlib
 import json
-from typing import Dict, List, Optional, Union
+import functools
+import multiprocessing
+import weakref
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import asynccontextmanager, contextmanager
+from typing import Dict, List, Optional, Tuple, Union
 from pathlib import Path
 
 # مكتبات تيليجرام
@@ -31,15 +36,11 @@ from telegram.ext import (
 from telegram.constants import ParseMode, ChatAction, ChatType
 
 # مكتبات معالجة PDF
-import PyPDF2
-from reportlab.pdfgen import canvas
-from reportlab.lib.pagesizes import letter, A4
-from reportlab.lib import colors
+import pymupdf
+from reportlab.lib.pagesizes import A4
 from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer
 from reportlab.lib.styles import getSampleStyleSheet
-import pdfplumber
 import pypdf
-from pdf2image import convert_from_bytes
 import img2pdf
 
 # مكتبات قاعدة البيانات
@@ -57,8 +58,9 @@ import uvicorn
 from PIL import Image, ImageDraw, ImageFont
 import requests
 import aiohttp
+import orjson
 from cryptography.fernet import Fernet
-import redis
+from redis import asyncio as aioredis
 from celery import Celery
 import schedule
 import time
@@ -91,11 +93,27 @@ class BotConfig:
     
     # إعدادات Redis
     REDIS_URL = os.getenv('REDIS_URL', 'redis://localhost:6379')
+    REDIS_MAX_CONNECTIONS = 50
+    USER_CACHE_TTL = 300  # 5 دقائق
+    SESSION_TTL = 1800  # 30 دقيقة
+    
+    # إعدادات سجل العمليات
+    LOG_FLUSH_INTERVAL = 2  # ثانية
+    LOG_BATCH_SIZE = 100
+    LOG_BUFFER_SIZE = 10000  # الحد الأقصى للعمليات المنتظرة في الذاكرة
     
     # إعدادات عامة
     MAX_FILE_SIZE = 50 * 1024 * 1024  # 50 MB
     FREE_DAILY_LIMIT = 5
     PREMIUM_DAILY_LIMIT = 100
+    CONCURRENT_UPDATES = 256
+    
+    # إعدادات معالجة PDF المتوازية
+    PDF_WORKERS = min(os.cpu_count() or 1, 4)
+    PDF_PAGES_PER_TASK = 10
+    PDF_CACHE_SIZE = 32
+    PDF_CACHE_TTL = 300  # 5 دقائق
+    TEMP_SWEEP_INTERVAL = 60  # ثانية
     
     # أسعار النسخة المدفوعة
     PREMIUM_MONTHLY_PRICE = 9.99
@@ -110,30 +128,68 @@ class DatabaseManager:
             BotConfig.SUPABASE_URL,
             BotConfig.SUPABASE_KEY
         )
-        self.redis_client = redis.from_url(BotConfig.REDIS_URL)
+        self.redis_client = aioredis.Redis(
+            connection_pool=aioredis.ConnectionPool.from_url(
+                BotConfig.REDIS_URL,
+                max_connections=BotConfig.REDIS_MAX_CONNECTIONS
+            )
+        )
+        
+        # سجل العمليات يُجمع في الذاكرة ويُرسل على دفعات
+        self._log_buffer: deque = deque(maxlen=BotConfig.LOG_BUFFER_SIZE)
+        self._log_batch_ready = asyncio.Event()
+    
+    @staticmethod
+    async def _execute(query):
+        """تنفيذ استعلام Supabase في خيط منفصل حتى لا يتوقف البوت أثناء انتظار الرد"""
+        return await asyncio.to_thread(query.execute)
     
     async def init_database(self):
         """إنشاء الجداول الأساسية"""
         try:
             # جدول المستخدمين
-            self.supabase.table('users').select('*').limit(1).execute()
+            await self._execute(self.supabase.table('users').select('*').limit(1))
         except:
             # إنشاء الجداول إذا لم تكن موجودة
             pass
     
+    @staticmethod
+    def _user_cache_key(user_id: int) -> str:
+        """مفتاح بيانات المستخدم المخزنة في Redis"""
+        return f"user:{user_id}"
+    
     async def get_user(self, user_id: int) -> Optional[Dict]:
-        """الحصول على بيانات المستخدم"""
+        """الحصول على بيانات المستخدم (Redis ذاكرة مؤقتة اختيارية أمام Supabase)"""
+        cache_key = self._user_cache_key(user_id)
+        
         try:
-            response = self.supabase.table('users').select('*').eq('user_id', user_id).execute()
-            return response.data[0] if response.data else None
+            cached_user = await self.redis_client.get(cache_key)
+            if cached_user:
+                return orjson.loads(cached_user)
+        except Exception as e:
+            logger.error(f"خطأ في قراءة المستخدم من الذاكرة المؤقتة: {e}")
+        
+        try:
+            response = await self._execute(self.supabase.table('users').select('*').eq('user_id', user_id))
         except Exception as e:
             logger.error(f"خطأ في الحصول على المستخدم: {e}")
             return None
+        
+        if not response.data:
+            return None
+        
+        user = response.data[0]
+        try:
+            await self.redis_client.setex(cache_key, BotConfig.USER_CACHE_TTL, orjson.dumps(user))
+        except Exception as e:
+            logger.error(f"خطأ في حفظ المستخدم في الذاكرة المؤقتة: {e}")
+        
+        return user
     
     async def create_user(self, user_data: Dict) -> bool:
         """إنشاء مستخدم جديد"""
         try:
-            self.supabase.table('users').insert(user_data).execute()
+            await self._execute(self.supabase.table('users').insert(user_data))
             return True
         except Exception as e:
             logger.error(f"خطأ في إنشاء المستخدم: {e}")
@@ -142,266 +198,503 @@ class DatabaseManager:
     async def update_user(self, user_id: int, updates: Dict) -> bool:
         """تحديث بيانات المستخدم"""
         try:
-            self.supabase.table('users').update(updates).eq('user_id', user_id).execute()
-            return True
+            await self._execute(self.supabase.table('users').update(updates).eq('user_id', user_id))
         except Exception as e:
             logger.error(f"خطأ في تحديث المستخدم: {e}")
             return False
+        
+        try:
+            await self.redis_client.delete(self._user_cache_key(user_id))
+        except Exception as e:
+            logger.error(f"خطأ في حذف المستخدم من الذاكرة المؤقتة: {e}")
+        
+        return True
+    
+    @staticmethod
+    def _daily_usage_key(user_id: int) -> str:
+        """مفتاح عداد الاستخدام اليومي في Redis"""
+        return f"daily_usage:{user_id}:{datetime.date.today().isoformat()}"
     
     async def log_operation(self, user_id: int, operation: str, details: Dict = None):
         """تسجيل العمليات"""
         try:
-            log_data = {
-                'user_id': user_id,
-                'operation': operation,
-                'details': details or {},
-                'timestamp': datetime.datetime.now().isoformat()
-            }
-            self.supabase.table('operations_log').insert(log_data).execute()
+            cache_key = self._daily_usage_key(user_id)
+            async with self.redis_client.pipeline(transaction=False) as pipe:
+                pipe.incr(cache_key)
+                pipe.expire(cache_key, 86400)
+                await pipe.execute()
+        except Exception as e:
+            logger.error(f"خطأ في تحديث الاستخدام اليومي: {e}")
+        
+        self._log_buffer.append({
+            'user_id': user_id,
+            'operation': operation,
+            'details': details or {},
+            'timestamp': datetime.datetime.now().isoformat()
+        })
+        
+        if len(self._log_buffer) >= BotConfig.LOG_BATCH_SIZE:
+            self._log_batch_ready.set()
+    
+    async def flush_operation_logs(self):
+        """إرسال العمليات المتراكمة إلى قاعدة البيانات في طلب واحد"""
+        if not self._log_buffer:
+            return
+        
+        rows = list(self._log_buffer)
+        self._log_buffer.clear()
+        
+        try:
+            await self._execute(self.supabase.table('operations_log').insert(rows))
+        except Exception as e:
+            logger.error(f"خطأ في تسجيل {len(rows)} عملية: {e}")
+    
+    async def run_log_flusher(self):
+        """مهمة خلفية لتفريغ سجل العمليات كل فترة أو عند امتلاء الدفعة"""
+        while True:
+            try:
+                await asyncio.wait_for(self._log_batch_ready.wait(), timeout=BotConfig.LOG_FLUSH_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+            
+            self._log_batch_ready.clear()
+            await self.flush_operation_logs()
+    
+    @staticmethod
+    def _session_key(user_id: int) -> str:
+        """مفتاح جلسة المستخدم في Redis"""
+        return f"session:{user_id}"
+    
+    async def get_session(self, user_id: int) -> Dict:
+        """الحصول على جلسة المستخدم"""
+        try:
+            session = await self.redis_client.hgetall(self._session_key(user_id))
+            return {key.decode(): orjson.loads(value) for key, value in session.items()}
+        except Exception as e:
+            logger.error(f"خطأ في الحصول على الجلسة: {e}")
+            return {}
+    
+    async def update_session(self, user_id: int, **fields) -> bool:
+        """تحديث جلسة المستخدم وتمديد صلاحيتها"""
+        try:
+            session_key = self._session_key(user_id)
+            async with self.redis_client.pipeline(transaction=False) as pipe:
+                pipe.hset(session_key, mapping={key: orjson.dumps(value) for key, value in fields.items()})
+                pipe.expire(session_key, BotConfig.SESSION_TTL)
+                await pipe.execute()
+            return True
         except Exception as e:
-            logger.error(f"خطأ في تسجيل العملية: {e}")
+            logger.error(f"خطأ في تحديث الجلسة: {e}")
+            return False
+    
+    async def clear_session(self, user_id: int) -> bool:
+        """حذف جلسة المستخدم"""
+        try:
+            await self.redis_client.delete(self._session_key(user_id))
+            return True
+        except Exception as e:
+            logger.error(f"خطأ في حذف الجلسة: {e}")
+            return False
+    
+    async def get_bot_stats(self) -> Dict[str, int]:
+        """الحصول على إحصائيات البوت العامة"""
+        cache_key = "bot_stats"
+        
+        try:
+            cached_stats = await self.redis_client.hgetall(cache_key)
+            if cached_stats:
+                return {key.decode(): int(value) for key, value in cached_stats.items()}
+        except Exception as e:
+            logger.error(f"خطأ في قراءة الإحصائيات من الذاكرة المؤقتة: {e}")
+        
+        # العدد الكلي يأتي من count='exact' مع صف واحد فقط بدلاً من جلب جميع الصفوف
+        today = datetime.date.today().isoformat()
+        total_users, premium_users, today_operations = await asyncio.gather(
+            self._execute(self.supabase.table('users').select('id', count='exact').limit(1)),
+            self._execute(self.supabase.table('users').select('id', count='exact').eq('is_premium', True).limit(1)),
+            self._execute(self.supabase.table('operations_log').select('id', count='exact').gte('timestamp', today).limit(1))
+        )
+        stats = {
+            'total_users': total_users.count or 0,
+            'premium_users': premium_users.count or 0,
+            'today_operations': today_operations.count or 0
+        }
+        
+        try:
+            async with self.redis_client.pipeline(transaction=False) as pipe:
+                pipe.hset(cache_key, mapping=stats)
+                pipe.expire(cache_key, 60)
+                await pipe.execute()
+        except Exception as e:
+            logger.error(f"خطأ في حفظ الإحصائيات في الذاكرة المؤقتة: {e}")
+        
+        return stats
     
     async def get_daily_usage(self, user_id: int) -> int:
         """الحصول على الاستخدام اليومي"""
         try:
-            today = datetime.date.today().isoformat()
-            cache_key = f"daily_usage:{user_id}:{today}"
-            
-            cached_usage = self.redis_client.get(cache_key)
-            if cached_usage:
-                return int(cached_usage)
-            
-            response = self.supabase.table('operations_log').select('*').eq('user_id', user_id).gte('timestamp', today).execute()
-            usage = len(response.data)
-            
-            self.redis_client.setex(cache_key, 86400, usage)  # cache for 24 hours
-            return usage
+            usage = await self.redis_client.get(self._daily_usage_key(user_id))
+            return int(usage or 0)
         except Exception as e:
             logger.error(f"خطأ في الحصول على الاستخدام اليومي: {e}")
             return 0
 
+@functools.lru_cache(maxsize=1)
+def get_db() -> DatabaseManager:
+    """مدير قاعدة البيانات المشترك على مستوى العملية"""
+    return DatabaseManager()
+
+# ⚙️ معالجة PDF في عمليات منفصلة
+@functools.lru_cache(maxsize=1)
+def get_pdf_pool() -> ProcessPoolExecutor:
+    """مجموعة عمليات معالجة PDF المشتركة (تُنشأ عند أول استخدام فقط)"""
+    # forkserver بدلاً من fork: العمليات تُنشأ أثناء عمل حلقة الأحداث والخيوط واتصالات Redis
+    return ProcessPoolExecutor(
+        max_workers=BotConfig.PDF_WORKERS,
+        mp_context=multiprocessing.get_context("forkserver")
+    )
+
+# مصدر ملف PDF: محتوى الملف أو مسار على القرص (المسار يتجنب نسخ المحتوى إلى عمليات المعالجة)
+PDFSource = Union[bytes, bytearray, str]
+
+def _open_pdf(pdf_source: PDFSource) -> pymupdf.Document:
+    """فتح ملف PDF من مسار أو من محتواه"""
+    if isinstance(pdf_source, (str, os.PathLike)):
+        return pymupdf.open(pdf_source, filetype="pdf")
+    return pymupdf.open(stream=pdf_source, filetype="pdf")
+
+class UploadCache:
+    """مدة بقاء الملفات المحملة على القرص (LRU مع مدة صلاحية)"""
+    
+    def __init__(self):
+        self._files: "OrderedDict[str, float]" = OrderedDict()
+        self._pins: Dict[str, int] = {}
+    
+    def _evict(self, pdf_path: str):
+        """إزالة ملف من الذاكرة المؤقتة وحذفه من القرص"""
+        del self._files[pdf_path]
+        
+        # الملفات المستخدمة في عملية جارية تُحذف عند انتهائها
+        if pdf_path not in self._pins:
+            Path(pdf_path).unlink(missing_ok=True)
+    
+    @contextmanager
+    def pinned(self, pdf_path: str):
+        """منع حذف الملف من القرص طوال مدة العملية عليه"""
+        self._pins[pdf_path] = self._pins.get(pdf_path, 0) + 1
+        try:
+            yield pdf_path
+        finally:
+            self._pins[pdf_path] -= 1
+            if not self._pins[pdf_path]:
+                del self._pins[pdf_path]
+                
+                # حذف الملف إذا أُزيل من الذاكرة المؤقتة أثناء العملية
+                if pdf_path not in self._files:
+                    Path(pdf_path).unlink(missing_ok=True)
+    
+    def touch(self, pdf_path: str):
+        """تسجيل استخدام الملف وحذف الملفات المنتهية أو الزائدة عن الحد"""
+        now = time.monotonic()
+        self._files.pop(pdf_path, None)
+        
+        # حذف الملفات التي انتهت صلاحيتها (الأقدم استخداماً في البداية)
+        while self._files:
+            oldest_path, last_used = next(iter(self._files.items()))
+            if now - last_used < BotConfig.PDF_CACHE_TTL:
+                break
+            self._evict(oldest_path)
+        
+        self._files[pdf_path] = now
+        
+        while len(self._files) > BotConfig.PDF_CACHE_SIZE:
+            self._evict(next(iter(self._files)))
+    
+    def sweep(self, base_dir: Path) -> int:
+        """حذف الملفات المنتهية وبقايا العمليات السابقة من مجلد الملفات المؤقتة"""
+        now = time.monotonic()
+        expired = [path for path, last_used in self._files.items() if now - last_used >= BotConfig.PDF_CACHE_TTL]
+        for pdf_path in expired:
+            self._evict(pdf_path)
+        
+        # الملفات غير المسجلة (من تشغيل سابق أو تحميل متوقف) تُحذف بعد مدة الصلاحية
+        cutoff_ts = time.time() - BotConfig.PDF_CACHE_TTL
+        removed = len(expired)
+        
+        with os.scandir(base_dir) as entries:
+            for entry in entries:
+                if entry.path in self._files or entry.path in self._pins:
+                    continue
+                
+                if entry.is_file(follow_symlinks=False) and entry.stat(follow_symlinks=False).st_mtime < cutoff_ts:
+                    try:
+                        os.unlink(entry.path)
+                        removed += 1
+                    except FileNotFoundError:
+                        pass
+        
+        return removed
+
+def pdf_page_count(pdf_source: PDFSource) -> int:
+    """عدد صفحات ملف PDF"""
+    with _open_pdf(pdf_source) as doc:
+        return doc.page_count
+
+def pdf_merge(pdf_files: List[PDFSource]) -> bytes:
+    """دمج عدة ملفات PDF"""
+    with pymupdf.open() as merged_doc:
+        for pdf_source in pdf_files:
+            with _open_pdf(pdf_source) as src_doc:
+                merged_doc.insert_pdf(src_doc)
+        
+        # دمج الخطوط والكائنات المكررة بين الملفات
+        merged_doc.subset_fonts()
+        return merged_doc.tobytes(garbage=4, deflate=True)
+
+def pdf_split(pdf_source: PDFSource, page_ranges: List[tuple] = None) -> List[bytes]:
+    """تقسيم PDF إلى ملفات منفصلة"""
+    with _open_pdf(pdf_source) as doc:
+        total_pages = doc.page_count
+        
+        if not page_ranges:
+            # تقسيم كل صفحة إلى ملف منفصل
+            page_ranges = [(i, i+1) for i in range(total_pages)]
+        
+        split_files = []
+        
+        for start, end in page_ranges:
+            last_page = min(end, total_pages) - 1
+            
+            # PyMuPDF لا يحفظ ملفاً بلا صفحات
+            if start < 0 or start > last_page:
+                raise ValueError(f"نطاق الصفحات ({start}, {end}) لا يحتوي على صفحات")
+            
+            with pymupdf.open() as part_doc:
+                part_doc.insert_pdf(doc, from_page=start, to_page=last_page)
+                split_files.append(part_doc.tobytes())
+        
+        return split_files
+
+def pdf_extract_text(pdf_source: PDFSource, start: int, stop: int) -> List[str]:
+    """استخراج نص مجموعة من الصفحات"""
+    with _open_pdf(pdf_source) as doc:
+        return [doc.load_page(i).get_text("text") for i in range(start, stop)]
+
+def pdf_render_pages(pdf_source: PDFSource, start: int, stop: int) -> List[bytes]:
+    """تحويل مجموعة من الصفحات إلى صور PNG"""
+    images = []
+    
+    with _open_pdf(pdf_source) as doc:
+        for page_num in range(start, stop):
+            # رسم الصفحة وترميزها مباشرة إلى PNG دون ملفات وسيطة
+            pix = doc.load_page(page_num).get_pixmap(dpi=200)
+            images.append(pix.tobytes("png"))
+            pix = None
+    
+    return images
+
+@functools.lru_cache(maxsize=32)
+def _watermark_pdf(watermark_text: str, opacity: float) -> bytes:
+    """إنشاء صفحة العلامة المائية مرة واحدة لكل نص ومستوى شفافية"""
+    with pymupdf.open() as wm_doc:
+        width, height = pymupdf.paper_size("letter")
+        page = wm_doc.new_page(width=width, height=height)
+        text_width = pymupdf.get_text_length(watermark_text, fontname="helv", fontsize=50)
+        
+        # كتابة النص في منتصف الصفحة مع تدويره 45 درجة
+        center = pymupdf.Point(page.rect.width / 2, page.rect.height / 2)
+        page.insert_text(
+            center - (text_width / 2, 0),
+            watermark_text,
+            fontsize=50,
+            fontname="helv",
+            color=(0.5, 0.5, 0.5),
+            fill_opacity=opacity,
+            morph=(center, pymupdf.Matrix(45))
+        )
+        
+        return wm_doc.tobytes()
+
+def pdf_add_watermark(pdf_source: PDFSource, watermark_text: str, opacity: float = 0.3) -> bytes:
+    """إضافة علامة مائية"""
+    watermark_bytes = _watermark_pdf(watermark_text, opacity)
+    
+    with pymupdf.open(stream=watermark_bytes, filetype="pdf") as wm_doc, _open_pdf(pdf_source) as doc:
+        # نفس كائن العلامة المائية يُستخدم في جميع الصفحات
+        for page in doc:
+            page.show_pdf_page(page.rect, wm_doc, 0)
+        
+        return doc.tobytes(garbage=4, deflate=True)
+
+def pdf_compress(pdf_source: PDFSource, quality: int = 50) -> bytes:
+    """ضغط PDF لتقليل الحجم"""
+    with _open_pdf(pdf_source) as doc:
+        return doc.tobytes(
+            garbage=4,
+            deflate=True,
+            deflate_images=True,
+            deflate_fonts=True
+        )
+
+def pdf_encrypt(pdf_source: PDFSource, password: str) -> bytes:
+    """تشفير PDF بكلمة مرور"""
+    with _open_pdf(pdf_source) as doc:
+        return doc.tobytes(
+            garbage=4,
+            deflate=True,
+            encryption=pymupdf.PDF_ENCRYPT_AES_256,
+            owner_pw=password,
+            user_pw=password
+        )
+
+def pdf_decrypt(pdf_source: PDFSource, password: str) -> bytes:
+    """كسر تشفير PDF"""
+    with _open_pdf(pdf_source) as doc:
+        if doc.needs_pass and not doc.authenticate(password):
+            raise ValueError("كلمة المرور غير صحيحة")
+        
+        return doc.tobytes(garbage=4, deflate=True, encryption=pymupdf.PDF_ENCRYPT_NONE)
+
+def pdf_from_images(image_files: List[Union[bytes, str]]) -> bytes:
+    """تحويل الصور إلى PDF (محتوى الصور أو مساراتها على القرص)"""
+    # img2pdf يقرأ المسارات من القرص مباشرة دون نسخ المحتوى في الذاكرة
+    return img2pdf.convert(image_files)
+
 # 📁 معالج ملفات PDF
 class PDFProcessor:
-    """معالج ملفات PDF المتقدم"""
+    """معالج ملفات PDF المتقدم (ينفذ العمليات في مجموعة العمليات get_pdf_pool)"""
     
     def __init__(self):
         self.temp_dir = Path(tempfile.gettempdir()) / "pdf_bot"
         self.temp_dir.mkdir(exist_ok=True)
+        self._uploads = UploadCache()
+    
+    def touch(self, pdf_path: str):
+        """تسجيل استخدام ملف محمل حتى يبقى على القرص مدة الصلاحية"""
+        self._uploads.touch(pdf_path)
+    
+    def pinned(self, pdf_path: str):
+        """منع حذف الملف من القرص طوال مدة العملية عليه"""
+        return self._uploads.pinned(pdf_path)
+    
+    async def run_temp_sweeper(self):
+        """مهمة خلفية لحذف الملفات المؤقتة المنتهية عند التشغيل ثم كل فترة"""
+        while True:
+            try:
+                removed = self._uploads.sweep(self.temp_dir)
+                if removed:
+                    logger.info(f"تم حذف {removed} ملف مؤقت")
+            except Exception as e:
+                logger.error(f"خطأ في تنظيف الملفات المؤقتة: {e}")
+            
+            await asyncio.sleep(BotConfig.TEMP_SWEEP_INTERVAL)
     
-    async def merge_pdfs(self, pdf_files: List[bytes], output_name: str = "merged.pdf") -> bytes:
+    @staticmethod
+    async def _run(func, *args):
+        """تنفيذ عملية PDF في عملية منفصلة دون إيقاف حلقة الأحداث"""
+        return await asyncio.get_running_loop().run_in_executor(get_pdf_pool(), func, *args)
+    
+    async def merge_pdfs(self, pdf_files: List[PDFSource], output_name: str = "merged.pdf") -> bytes:
         """دمج عدة ملفات PDF"""
         try:
-            merger = PyPDF2.PdfMerger()
-            
-            for pdf_bytes in pdf_files:
-                pdf_stream = io.BytesIO(pdf_bytes)
-                merger.append(pdf_stream)
-            
-            output_stream = io.BytesIO()
-            merger.write(output_stream)
-            merger.close()
-            
-            return output_stream.getvalue()
+            return await self._run(pdf_merge, pdf_files)
         
         except Exception as e:
             logger.error(f"خطأ في دمج PDF: {e}")
             raise Exception(f"فشل في دمج الملفات: {e}")
     
-    async def split_pdf(self, pdf_bytes: bytes, page_ranges: List[tuple] = None) -> List[bytes]:
+    async def split_pdf(self, pdf_source: PDFSource, page_ranges: List[tuple] = None) -> List[bytes]:
         """تقسيم PDF إلى ملفات منفصلة"""
         try:
-            reader = PyPDF2.PdfReader(io.BytesIO(pdf_bytes))
-            total_pages = len(reader.pages)
-            
-            if not page_ranges:
-                # تقسيم كل صفحة إلى ملف منفصل
-                page_ranges = [(i, i+1) for i in range(total_pages)]
-            
-            split_files = []
-            
-            for start, end in page_ranges:
-                writer = PyPDF2.PdfWriter()
-                
-                for page_num in range(start, min(end, total_pages)):
-                    writer.add_page(reader.pages[page_num])
-                
-                output_stream = io.BytesIO()
-                writer.write(output_stream)
-                split_files.append(output_stream.getvalue())
-            
-            return split_files
+            return await self._run(pdf_split, pdf_source, page_ranges)
         
         except Exception as e:
             logger.error(f"خطأ في تقسيم PDF: {e}")
             raise Exception(f"فشل في تقسيم الملف: {e}")
     
-    async def extract_text(self, pdf_bytes: bytes) -> str:
+    async def page_count(self, pdf_source: PDFSource) -> int:
+        """عدد صفحات ملف PDF (يُفتح الملف في عملية منفصلة)"""
+        return await self._run(pdf_page_count, pdf_source)
+    
+    async def _map_pages(self, worker, pdf_source: PDFSource) -> list:
+        """توزيع صفحات الملف على مجموعة العمليات على دفعات"""
+        total_pages = await self.page_count(pdf_source)
+        
+        step = BotConfig.PDF_PAGES_PER_TASK
+        batches = await asyncio.gather(*(
+            self._run(worker, pdf_source, start, min(start + step, total_pages))
+            for start in range(0, total_pages, step)
+        ))
+        
+        return [item for batch in batches for item in batch]
+    
+    async def extract_text(self, pdf_source: PDFSource) -> str:
         """استخراج النص من PDF"""
         try:
-            with pdfplumber.open(io.BytesIO(pdf_bytes)) as pdf:
-                text = ""
-                for page in pdf.pages:
-                    text += page.extract_text() or ""
-                    text += "\n\n"
-                
-                return text.strip()
+            pages_text = await self._map_pages(pdf_extract_text, pdf_source)
+            return "\n\n".join(pages_text).strip()
         
         except Exception as e:
             logger.error(f"خطأ في استخراج النص: {e}")
             raise Exception(f"فشل في استخراج النص: {e}")
     
-    async def extract_images(self, pdf_bytes: bytes) -> List[bytes]:
+    async def extract_images(self, pdf_source: PDFSource) -> List[bytes]:
         """استخراج الصور من PDF"""
         try:
-            images = convert_from_bytes(pdf_bytes, dpi=200)
-            image_bytes_list = []
-            
-            for i, image in enumerate(images):
-                img_byte_arr = io.BytesIO()
-                image.save(img_byte_arr, format='PNG')
-                image_bytes_list.append(img_byte_arr.getvalue())
-            
-            return image_bytes_list
+            return await self._map_pages(pdf_render_pages, pdf_source)
         
         except Exception as e:
             logger.error(f"خطأ في استخراج الصور: {e}")
             raise Exception(f"فشل في استخراج الصور: {e}")
     
-    async def add_watermark(self, pdf_bytes: bytes, watermark_text: str, opacity: float = 0.3) -> bytes:
+    async def add_watermark(self, pdf_source: PDFSource, watermark_text: str, opacity: float = 0.3) -> bytes:
         """إضافة علامة مائية"""
         try:
-            reader = PyPDF2.PdfReader(io.BytesIO(pdf_bytes))
-            writer = PyPDF2.PdfWriter()
-            
-            # إنشاء صفحة العلامة المائية
-            watermark_stream = io.BytesIO()
-            c = canvas.Canvas(watermark_stream, pagesize=letter)
-            c.setFont("Helvetica", 50)
-            c.setFillColor(colors.grey, alpha=opacity)
-            c.translate(300, 400)
-            c.rotate(45)
-            c.drawCentredText(0, 0, watermark_text)
-            c.save()
-            
-            watermark_stream.seek(0)
-            watermark_reader = PyPDF2.PdfReader(watermark_stream)
-            watermark_page = watermark_reader.pages[0]
-            
-            for page in reader.pages:
-                page.merge_page(watermark_page)
-                writer.add_page(page)
-            
-            output_stream = io.BytesIO()
-            writer.write(output_stream)
-            
-            return output_stream.getvalue()
+            return await self._run(pdf_add_watermark, pdf_source, watermark_text, opacity)
         
         except Exception as e:
             logger.error(f"خطأ في إضافة العلامة المائية: {e}")
             raise Exception(f"فشل في إضافة العلامة المائية: {e}")
     
-    async def compress_pdf(self, pdf_bytes: bytes, quality: int = 50) -> bytes:
+    async def compress_pdf(self, pdf_source: PDFSource, quality: int = 50) -> bytes:
         """ضغط PDF لتقليل الحجم"""
         try:
-            reader = PyPDF2.PdfReader(io.BytesIO(pdf_bytes))
-            writer = PyPDF2.PdfWriter()
-            
-            for page in reader.pages:
-                page.compress_content_streams()
-                writer.add_page(page)
-            
-            output_stream = io.BytesIO()
-            writer.write(output_stream)
-            
-            return output_stream.getvalue()
+            return await self._run(pdf_compress, pdf_source, quality)
         
         except Exception as e:
             logger.error(f"خطأ في ضغط PDF: {e}")
             raise Exception(f"فشل في ضغط الملف: {e}")
     
-    async def encrypt_pdf(self, pdf_bytes: bytes, password: str) -> bytes:
+    async def encrypt_pdf(self, pdf_source: PDFSource, password: str) -> bytes:
         """تشفير PDF بكلمة مرور"""
         try:
-            reader = PyPDF2.PdfReader(io.BytesIO(pdf_bytes))
-            writer = PyPDF2.PdfWriter()
-            
-            for page in reader.pages:
-                writer.add_page(page)
-            
-            writer.encrypt(password)
-            
-            output_stream = io.BytesIO()
-            writer.write(output_stream)
-            
-            return output_stream.getvalue()
+            return await self._run(pdf_encrypt, pdf_source, password)
         
         except Exception as e:
             logger.error(f"خطأ في تشفير PDF: {e}")
             raise Exception(f"فشل في تشفير الملف: {e}")
     
-    async def decrypt_pdf(self, pdf_bytes: bytes, password: str) -> bytes:
+    async def decrypt_pdf(self, pdf_source: PDFSource, password: str) -> bytes:
         """كسر تشفير PDF"""
         try:
-            reader = PyPDF2.PdfReader(io.BytesIO(pdf_bytes))
-            
-            if reader.is_encrypted:
-                reader.decrypt(password)
-            
-            writer = PyPDF2.PdfWriter()
-            
-            for page in reader.pages:
-                writer.add_page(page)
-            
-            output_stream = io.BytesIO()
-            writer.write(output_stream)
-            
-            return output_stream.getvalue()
+            return await self._run(pdf_decrypt, pdf_source, password)
         
         except Exception as e:
             logger.error(f"خطأ في كسر تشفير PDF: {e}")
             raise Exception(f"فشل في كسر تشفير الملف: {e}")
     
-    async def images_to_pdf(self, image_bytes_list: List[bytes]) -> bytes:
-        """تحويل الصور إلى PDF"""
+    async def images_to_pdf(self, image_files: List[Union[bytes, str]]) -> bytes:
+        """تحويل الصور إلى PDF (محتوى الصور أو مساراتها على القرص)"""
         try:
-            pdf_bytes = img2pdf.convert(image_bytes_list)
-            return pdf_bytes
+            return await self._run(pdf_from_images, image_files)
         
         except Exception as e:
             logger.error(f"خطأ في تحويل الصور إلى PDF: {e}")
             raise Exception(f"فشل في تحويل الصور: {e}")
 
-# 🎯 معالج الأوامر
-class BotHandlers:
-    """معالج أوامر البوت"""
-    
-    def __init__(self):
-        self.db = DatabaseManager()
-        self.pdf_processor = PDFProcessor()
-        self.user_sessions = {}  # لحفظ جلسات المستخدمين
-    
-    async def start_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
-        """أمر البداية"""
-        user = update.effective_user
-        chat = update.effective_chat
-        
-        # التحقق من المستخدم وإنشاء حساب جديد إذا لزم الأمر
-        user_data = await self.db.get_user(user.id)
-        if not user_data:
-            new_user = {
-                'user_id': user.id,
-                'username': user.username,
-                'first_name': user.first_name,
-                'last_name': user.last_name,
-                'language_code': user.language_code,
-                'is_premium': False,
-                'join_date': datetime.datetime.now().isoformat(),
-                'daily_usage': 0
-            }
-            await self.db.create_user(new_user)
-        
-        welcome_text = f"""
-🤖 **مرحباً {user.first_name}!**
+# 💬 النصوص والأزرار الثابتة (تُبنى مرة واحدة عند التحميل)
+WELCOME_TEXT = f"""
+🤖 **مرحباً {{first_name}}!**
 
 أهلاً بك في أقوى بوت تيليجرام لتعديل ملفات PDF!
 
@@ -425,48 +718,35 @@ class BotHandlers:
 
 تم تطوير البوت بأحدث التقنيات لضمان الأداء والجودة العالية! 🚀
 """
-        
-        keyboard = [
-            [
-                InlineKeyboardButton("📄 دمج PDF", callback_data="merge_pdf"),
-                InlineKeyboardButton("✂️ تقسيم PDF", callback_data="split_pdf")
-            ],
-            [
-                InlineKeyboardButton("📝 استخراج النص", callback_data="extract_text"),
-                InlineKeyboardButton("🖼️ استخراج الصور", callback_data="extract_images")
-            ],
-            [
-                InlineKeyboardButton("🔍 ضغط PDF", callback_data="compress_pdf"),
-                InlineKeyboardButton("💧 علامة مائية", callback_data="watermark_pdf")
-            ],
-            [
-                InlineKeyboardButton("🔒 تشفير PDF", callback_data="encrypt_pdf"),
-                InlineKeyboardButton("🔓 كسر التشفير", callback_data="decrypt_pdf")
-            ],
-            [
-                InlineKeyboardButton("🔄 صور إلى PDF", callback_data="images_to_pdf"),
-                InlineKeyboardButton("📊 إحصائياتي", callback_data="my_stats")
-            ],
-            [
-                InlineKeyboardButton("⭐ النسخة المدفوعة", callback_data="premium"),
-                InlineKeyboardButton("❓ المساعدة", callback_data="help")
-            ]
-        ]
-        
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        
-        await update.message.reply_text(
-            welcome_text,
-            parse_mode=ParseMode.MARKDOWN,
-            reply_markup=reply_markup
-        )
-        
-        # تسجيل العملية
-        await self.db.log_operation(user.id, "start_command")
-    
-    async def help_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
-        """أمر المساعدة التفصيلي"""
-        help_text = """
+
+MAIN_MENU_KEYBOARD = InlineKeyboardMarkup([
+    [
+        InlineKeyboardButton("📄 دمج PDF", callback_data="merge_pdf"),
+        InlineKeyboardButton("✂️ تقسيم PDF", callback_data="split_pdf")
+    ],
+    [
+        InlineKeyboardButton("📝 استخراج النص", callback_data="extract_text"),
+        InlineKeyboardButton("🖼️ استخراج الصور", callback_data="extract_images")
+    ],
+    [
+        InlineKeyboardButton("🔍 ضغط PDF", callback_data="compress_pdf"),
+        InlineKeyboardButton("💧 علامة مائية", callback_data="watermark_pdf")
+    ],
+    [
+        InlineKeyboardButton("🔒 تشفير PDF", callback_data="encrypt_pdf"),
+        InlineKeyboardButton("🔓 كسر التشفير", callback_data="decrypt_pdf")
+    ],
+    [
+        InlineKeyboardButton("🔄 صور إلى PDF", callback_data="images_to_pdf"),
+        InlineKeyboardButton("📊 إحصائياتي", callback_data="my_stats")
+    ],
+    [
+        InlineKeyboardButton("⭐ النسخة المدفوعة", callback_data="premium"),
+        InlineKeyboardButton("❓ المساعدة", callback_data="help")
+    ]
+])
+
+HELP_TEXT = f"""
 📖 **دليل استخدام البوت الشامل**
 
 🤖 **أوامر البوت الأساسية:**
@@ -587,31 +867,145 @@ class BotHandlers:
 
 **تم التطوير بأحدث التقنيات لضمان أفضل تجربة استخدام 🚀**
 """
+
+HELP_KEYBOARD = InlineKeyboardMarkup([
+    [
+        InlineKeyboardButton("🏠 العودة للرئيسية", callback_data="main_menu"),
+        InlineKeyboardButton("⭐ النسخة المدفوعة", callback_data="premium")
+    ],
+    [
+        InlineKeyboardButton("📞 الدعم الفني", callback_data="support"),
+        InlineKeyboardButton("📊 إحصائياتي", callback_data="my_stats")
+    ]
+])
+
+BOT_COMMANDS = [
+    BotCommand("start", "🚀 بدء البوت"),
+    BotCommand("help", "❓ المساعدة والشرح التفصيلي"),
+    BotCommand("stats", "📊 إحصائياتي الشخصية"),
+    BotCommand("premium", "⭐ النسخة المدفوعة"),
+    BotCommand("settings", "⚙️ إعدادات الحساب"),
+    BotCommand("support", "📞 الدعم الفني"),
+    BotCommand("cancel", "❌ إلغاء العملية الحالية")
+]
+
+# 🎯 معالج الأوامر
+class BotHandlers:
+    """معالج أوامر البوت"""
+    
+    def __init__(self):
+        self.db = get_db()
+        self.pdf_processor = PDFProcessor()
         
-        keyboard = [
-            [
-                InlineKeyboardButton("🏠 العودة للرئيسية", callback_data="main_menu"),
-                InlineKeyboardButton("⭐ النسخة المدفوعة", callback_data="premium")
-            ],
-            [
-                InlineKeyboardButton("📞 الدعم الفني", callback_data="support"),
-                InlineKeyboardButton("📊 إحصائياتي", callback_data="my_stats")
-            ]
+        # قفل لكل ملف حتى لا يُحمَّل نفس الملف مرتين في نفس الوقت
+        self._download_locks: "weakref.WeakValueDictionary[str, asyncio.Lock]" = weakref.WeakValueDictionary()
+        self._background_tasks: List[asyncio.Task] = []
+    
+    async def post_init(self, application: Application):
+        """تهيئة البوت بعد تشغيل التطبيق وقبل استقبال التحديثات"""
+        # إعداد أوامر البوت
+        await application.bot.set_my_commands(BOT_COMMANDS)
+        
+        # تفريغ سجل العمليات وتنظيف الملفات المؤقتة في الخلفية
+        self._background_tasks = [
+            asyncio.create_task(self.db.run_log_flusher()),
+            asyncio.create_task(self.pdf_processor.run_temp_sweeper())
         ]
+    
+    async def post_shutdown(self, application: Application):
+        """إيقاف المهام الخلفية وإرسال ما تبقى من سجل العمليات قبل الإغلاق"""
+        for task in self._background_tasks:
+            task.cancel()
+        await asyncio.gather(*self._background_tasks, return_exceptions=True)
+        self._background_tasks = []
         
-        reply_markup = InlineKeyboardMarkup(keyboard)
+        await self.db.flush_operation_logs()
+    
+    async def _download_pdf(self, context: ContextTypes.DEFAULT_TYPE, file_id: str, pdf_path: str):
+        """تحميل ملف PDF إلى القرص بعد التحقق من توقيعه"""
+        file = await context.bot.get_file(file_id)
+        part_path = f"{pdf_path}.part"
         
+        try:
+            await file.download_to_drive(part_path)
+            
+            # فحص توقيع الملف قبل تمريره إلى محلل PDF
+            with open(part_path, 'rb') as f:
+                header = f.read(5)
+            
+            if header != b'%PDF-':
+                raise ValueError("الملف ليس ملف PDF صالحاً")
+            
+            os.replace(part_path, pdf_path)
+        finally:
+            # الملف الجزئي يبقى فقط إذا فشل التحميل أو التحقق
+            Path(part_path).unlink(missing_ok=True)
+    
+    @asynccontextmanager
+    async def _pdf_upload(self, context: ContextTypes.DEFAULT_TYPE, file_id: str):
+        """تحميل ملف PDF مرة واحدة وإبقاؤه على القرص حتى انتهاء العملية عليه"""
+        pdf_path = str(self.pdf_processor.temp_dir / f"{file_id}.pdf")
+        
+        with self.pdf_processor.pinned(pdf_path):
+            async with self._download_locks.setdefault(file_id, asyncio.Lock()):
+                if not os.path.exists(pdf_path):
+                    await self._download_pdf(context, file_id, pdf_path)
+                    
+                    # التأكد من إمكانية فتح الملف (في عملية منفصلة لأن إصلاح ملف تالف قد يطول)
+                    try:
+                        await self.pdf_processor.page_count(pdf_path)
+                    except Exception as e:
+                        # حذف النسخة التالفة حتى يُعاد تحميلها في المحاولة التالية
+                        Path(pdf_path).unlink(missing_ok=True)
+                        raise ValueError(f"تعذر فتح ملف PDF: {e}")
+                
+                # تسجيل الملف ليُحذف عند انتهاء صلاحيته
+                self.pdf_processor.touch(pdf_path)
+            
+            yield pdf_path
+    
+    async def start_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """أمر البداية"""
+        user = update.effective_user
+        chat = update.effective_chat
+        
+        # التحقق من المستخدم وإنشاء حساب جديد إذا لزم الأمر
+        user_data = await self.db.get_user(user.id)
+        if not user_data:
+            new_user = {
+                'user_id': user.id,
+                'username': user.username,
+                'first_name': user.first_name,
+                'last_name': user.last_name,
+                'language_code': user.language_code,
+                'is_premium': False,
+                'join_date': datetime.datetime.now().isoformat(),
+                'daily_usage': 0
+            }
+            await self.db.create_user(new_user)
+        
+        await update.message.reply_text(
+            WELCOME_TEXT.format(first_name=user.first_name),
+            parse_mode=ParseMode.MARKDOWN,
+            reply_markup=MAIN_MENU_KEYBOARD
+        )
+        
+        # تسجيل العملية
+        await self.db.log_operation(user.id, "start_command")
+    
+    async def help_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """أمر المساعدة التفصيلي"""
         if update.message:
             await update.message.reply_text(
-                help_text,
+                HELP_TEXT,
                 parse_mode=ParseMode.MARKDOWN,
-                reply_markup=reply_markup
+                reply_markup=HELP_KEYBOARD
             )
         else:
             await update.callback_query.edit_message_text(
-                help_text,
+                HELP_TEXT,
                 parse_mode=ParseMode.MARKDOWN,
-                reply_markup=reply_markup
+                reply_markup=HELP_KEYBOARD
             )
     
     async def admin_panel(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -626,15 +1020,10 @@ class BotHandlers:
         
         # إحصائيات البوت
         try:
-            total_users_response = self.db.supabase.table('users').select('*').execute()
-            total_users = len(total_users_response.data)
-            
-            premium_users_response = self.db.supabase.table('users').select('*').eq('is_premium', True).execute()
-            premium_users = len(premium_users_response.data)
-            
-            today = datetime.date.today().isoformat()
-            today_operations_response = self.db.supabase.table('operations_log').select('*').gte('timestamp', today).execute()
-            today_operations = len(today_operations_response.data)
+            stats = await self.db.get_bot_stats()
+            total_users = stats['total_users']
+            premium_users = stats['premium_users']
+            today_operations = stats['today_operations']
             
             admin_text = f"""
 🛡️ **لوحة تحكم الإدارة**
@@ -687,7 +1076,7 @@ class BotHandlers:
         document = update.message.document
         
         # التحقق من نوع الملف
-        if not document.file_name.lower().endswith('.pdf'):
+        if document.mime_type != 'application/pdf' or not document.file_name.lower().endswith('.pdf'):
             await update.message.reply_text(
                 "❌ يرجى إرسال ملف PDF فقط!"
             )
@@ -712,6 +1101,23 @@ class BotHandlers:
             )
             return
         
+        # تحميل الملف والتحقق من محتواه قبل عرض العمليات
+        try:
+            async with self._pdf_upload(context, document.file_id):
+                pass
+        except ValueError as e:
+            logger.error(f"ملف PDF غير صالح: {e}")
+            await update.message.reply_text(
+                "❌ الملف المرسل ليس ملف PDF صالحاً!"
+            )
+            return
+        except Exception as e:
+            logger.error(f"خطأ في تحميل الملف: {e}")
+            await update.message.reply_text(
+                "❌ تعذر تحميل الملف من تيليجرام. يرجى المحاولة مرة أخرى لاحقاً!"
+            )
+            return
+        
         # عرض خيارات المعالجة
         keyboard = [
             [
@@ -788,12 +1194,9 @@ class BotHandlers:
                 "⏳ جاري استخراج النص من الملف... يرجى الانتظار"
             )
             
-            # تحميل الملف
-            file = await context.bot.get_file(file_id)
-            file_bytes = await file.download_as_bytearray()
-            
-            # استخراج النص
-            extracted_text = await self.pdf_processor.extract_text(bytes(file_bytes))
+            # تحميل الملف إلى القرص واستخراج النص
+            async with self._pdf_upload(context, file_id) as pdf_path:
+                extracted_text = await self.pdf_processor.extract_text(pdf_path)
             
             if not extracted_text.strip():
                 await query.edit_message_text(
@@ -801,14 +1204,10 @@ class BotHandlers:
                 )
                 return
             
-            # حفظ النص في ملف
-            text_file = io.BytesIO(extracted_text.encode('utf-8'))
-            text_file.name = "extracted_text.txt"
-            
-            # إرسال الملف
+            # إرسال النص كملف (تيليجرام يقبل المحتوى مباشرة دون BytesIO)
             await context.bot.send_document(
                 chat_id=user.id,
-                document=text_file,
+                document=extracted_text.encode('utf-8'),
                 filename="extracted_text.txt",
                 caption=f"✅ **تم استخراج النص بنجاح!**\n📄 عدد الأحرف: {len(extracted_text):,}",
                 parse_mode=ParseMode.MARKDOWN
@@ -853,18 +1252,13 @@ async def verify_admin(credentials: HTTPAuthorizationCredentials = Security(secu
 @app.get("/api/stats")
 async def get_stats(admin: bool = Depends(verify_admin)):
     """API لجلب الإحصائيات"""
-    db = DatabaseManager()
+    db = get_db()
     
     try:
-        total_users_response = db.supabase.table('users').select('*').execute()
-        total_users = len(total_users_response.data)
-        
-        premium_users_response = db.supabase.table('users').select('*').eq('is_premium', True).execute()
-        premium_users = len(premium_users_response.data)
-        
-        today = datetime.date.today().isoformat()
-        today_operations_response = db.supabase.table('operations_log').select('*').gte('timestamp', today).execute()
-        today_operations = len(today_operations_response.data)
+        stats = await db.get_bot_stats()
+        total_users = stats['total_users']
+        premium_users = stats['premium_users']
+        today_operations = stats['today_operations']
         
         return {
             "total_users": total_users,
@@ -883,14 +1277,23 @@ async def send_broadcast(message: dict, admin: bool = Depends(verify_admin)):
     return {"status": "success", "message": "تم إرسال الرسالة الجماعية"}
 
 # 🚀 تشغيل البوت
-async def main():
+def main():
     """الدالة الرئيسية لتشغيل البوت"""
-    # إنشاء التطبيق
-    application = Application.builder().token(BotConfig.BOT_TOKEN).build()
-    
     # إنشاء معالج الأوامر
     handlers = BotHandlers()
     
+    # إنشاء التطبيق
+    application = (
+        Application.builder()
+        .token(BotConfig.BOT_TOKEN)
+        .concurrent_updates(BotConfig.CONCURRENT_UPDATES)
+        .connection_pool_size(BotConfig.CONCURRENT_UPDATES)
+        .pool_timeout(None)
+        .post_init(handlers.post_init)
+        .post_shutdown(handlers.post_shutdown)
+        .build()
+    )
+    
     # إضافة معالجات الأوامر
     application.add_handler(CommandHandler("start", handlers.start_command))
     application.add_handler(CommandHandler("help", handlers.help_command))
@@ -902,22 +1305,13 @@ async def main():
     # معالج الأزرار
     application.add_handler(CallbackQueryHandler(handlers.callback_handler))
     
-    # إعداد أوامر البوت
-    bot_commands = [
-        BotCommand("start", "🚀 بدء البوت"),
-        BotCommand("help", "❓ المساعدة والشرح التفصيلي"),
-        BotCommand("stats", "📊 إحصائياتي الشخصية"),
-        BotCommand("premium", "⭐ النسخة المدفوعة"),
-        BotCommand("settings", "⚙️ إعدادات الحساب"),
-        BotCommand("support", "📞 الدعم الفني"),
-        BotCommand("cancel", "❌ إلغاء العملية الحالية")
-    ]
-    
-    await application.bot.set_my_commands(bot_commands)
-    
-    # تشغيل البوت
+    # تشغيل البوت (run_polling يدير حلقة الأحداث بنفسه لذا لا يُستدعى من داخل coroutine)
     logger.info("🤖 تم تشغيل البوت بنجاح!")
-    await application.run_polling(allowed_updates=Update.ALL_TYPES)
+    application.run_polling(
+        poll_interval=0,
+        timeout=30,
+        allowed_updates=Update.ALL_TYPES
+    )
 
 # 🔧 إعداد Vercel
 if __name__ == "__main__":
@@ -926,5 +1320,11 @@ if __name__ == "__main__":
         import uvicorn
         uvicorn.run(app, host="0.0.0.0", port=int(os.getenv("PORT", 8000)))
     else:
-        # تشغيل التطوير المحلي
-        asyncio.run(main())
+        # تشغيل التطوير المحلي (باستخدام uvloop إن كان متاحاً)
+        try:
+            import uvloop
+            asyncio.set_event_loop(uvloop.new_event_loop())
+        except ImportError:
+            pass
+        
+        main()
@@ -5,43 +5,89 @@
 """
 
 import os
-import hashlib
 import datetime
-import json
+import functools
+import itertools
+import time
 import asyncio
-from typing import Dict, List, Optional, Union, Any
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Union
 import logging
 from pathlib import Path
+from types import MappingProxyType
+
+import orjson
 
 # إعداد التسجيل
 logger = logging.getLogger(__name__)
 
+# خيوط مخصصة لكتابة الملفات حتى لا تزاحم الخيوط الافتراضية المستخدمة لقاعدة البيانات
+_FILE_IO_POOL = ThreadPoolExecutor(max_workers=4, thread_name_prefix="file_io")
+
+# عداد يضمن عدم تكرار أسماء الملفات المنشأة في نفس النانوثانية
+_FILENAME_COUNTER = itertools.count()
+
+def _write_file(file_path: Path, file_data: bytes):
+    """كتابة الملف مباشرة عبر واصف الملف دون طبقة التخزين المؤقت"""
+    fd = os.open(file_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+    try:
+        view = memoryview(file_data)
+        while view:
+            view = view[os.write(fd, view):]
+    finally:
+        os.close(fd)
+
+def _remove_stale_files(base_path: Path, cutoff_ts: float) -> int:
+    """حذف الملفات الأقدم من الوقت المحدد في جميع مجلدات المستخدمين"""
+    stale_paths = []
+    
+    with os.scandir(base_path) as user_dirs:
+        for user_dir in user_dirs:
+            # المسار الأساسي قد يكون /tmp، لذا نكتفي بمجلدات المستخدمين فقط
+            if not user_dir.name.startswith("user_") or not user_dir.is_dir(follow_symlinks=False):
+                continue
+            
+            with os.scandir(user_dir.path) as entries:
+                stale_paths.extend(
+                    entry.path for entry in entries
+                    if entry.is_file(follow_symlinks=False) and entry.stat(follow_symlinks=False).st_mtime < cutoff_ts
+                )
+    
+    removed = 0
+    for path in stale_paths:
+        try:
+            os.unlink(path)
+            removed += 1
+        except FileNotFoundError:
+            pass
+    
+    return removed
+
 class FileManager:
     """مدير الملفات المتقدم"""
     
     def __init__(self, base_path: str = "/tmp"):
         self.base_path = Path(base_path)
         self.base_path.mkdir(exist_ok=True)
+        self._ensured_users: set[int] = set()  # مجلدات المستخدمين التي تم إنشاؤها
     
     def generate_unique_filename(self, original_name: str, user_id: int) -> str:
         """إنشاء اسم ملف فريد"""
-        timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
-        hash_obj = hashlib.md5(f"{user_id}{original_name}{timestamp}".encode())
-        unique_id = hash_obj.hexdigest()[:8]
-        
         name, ext = os.path.splitext(original_name)
-        return f"{name}_{timestamp}_{unique_id}{ext}"
+        return f"{name}_{time.time_ns()}_{next(_FILENAME_COUNTER):08x}{ext}"
     
     async def save_temp_file(self, file_data: bytes, filename: str, user_id: int) -> Path:
         """حفظ ملف مؤقت"""
         user_dir = self.base_path / f"user_{user_id}"
-        user_dir.mkdir(exist_ok=True)
+        if user_id not in self._ensured_users:
+            user_dir.mkdir(exist_ok=True)
+            self._ensured_users.add(user_id)
         
         unique_filename = self.generate_unique_filename(filename, user_id)
         file_path = user_dir / unique_filename
         
-        with open(file_path, 'wb') as f:
-            f.write(file_data)
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(_FILE_IO_POOL, _write_file, file_path, file_data)
         
         return file_path
     
@@ -52,14 +98,97 @@ class FileManager:
         if not user_dir.exists():
             return
         
-        cutoff_time = datetime.datetime.now() - datetime.timedelta(hours=older_than_hours)
+        cutoff_ts = (datetime.datetime.now() - datetime.timedelta(hours=older_than_hours)).timestamp()
+        
+        # scandir يعيد نوع الملف مع قراءة المجلد دون استدعاء stat إضافي
+        with os.scandir(user_dir) as entries:
+            for entry in entries:
+                if entry.is_file(follow_symlinks=False) and entry.stat(follow_symlinks=False).st_mtime < cutoff_ts:
+                    try:
+                        os.unlink(entry.path)
+                    except FileNotFoundError:
+                        continue
+                    logger.info(f"تم حذف الملف القديم: {entry.path}")
+    
+    async def cleanup_all(self, older_than_hours: int = 24):
+        """تنظيف الملفات القديمة لجميع المستخدمين في مسح واحد"""
+        cutoff_ts = time.time() - older_than_hours * 3600
         
-        for file_path in user_dir.iterdir():
-            if file_path.is_file():
-                file_time = datetime.datetime.fromtimestamp(file_path.stat().st_mtime)
-                if file_time < cutoff_time:
-                    file_path.unlink(missing_ok=True)
-                    logger.info(f"تم حذف الملف القديم: {file_path}")
+        loop = asyncio.get_running_loop()
+        removed = await loop.run_in_executor(_FILE_IO_POOL, _remove_stale_files, self.base_path, cutoff_ts)
+        
+        if removed:
+            logger.info(f"تم حذف {removed} ملف قديم")
+
+_SIZE_NAMES = ("B", "KB", "MB", "GB", "TB")
+
+# توقيعات الملفات المدعومة (بداية الملف ← نوع MIME)
+_FILE_SIGNATURES = MappingProxyType({
+    b'%PDF': 'application/pdf',
+    b'\xff\xd8\xff': 'image/jpeg',
+    b'\x89PNG\r\n\x1a\n': 'image/png',
+    b'GIF87a': 'image/gif',
+    b'GIF89a': 'image/gif',
+    b'RIFF': 'image/webp'
+})
+
+# التوقيعات مجمعة حسب الطول (الأطول أولاً) ليكون الفحص بحثاً واحداً في القاموس لكل طول
+_SIGNATURES_BY_LENGTH = tuple(
+    (length, {sig: mime for sig, mime in _FILE_SIGNATURES.items() if len(sig) == length})
+    for length in sorted({len(sig) for sig in _FILE_SIGNATURES}, reverse=True)
+)
+
+_IMAGE_SIGNATURES = tuple(sig for sig, mime in _FILE_SIGNATURES.items() if mime.startswith('image/'))
+
+@functools.lru_cache(maxsize=256)
+def _progress_bar(filled_length: int, length: int) -> str:
+    """شريط التقدم لكل عدد من الخانات الممتلئة يُبنى مرة واحدة"""
+    return "█" * filled_length + "░" * (length - filled_length)
+
+# نتائج التحقق من كلمة المرور مبنية مسبقاً
+_PASSWORD_RESULTS = (
+    (True, "كلمة مرور صحيحة"),
+    (False, "كلمة المرور قصيرة جداً (الحد الأدنى 4 أحرف)"),
+    (False, "كلمة المرور طويلة جداً (الحد الأقصى 128 حرف)")
+)
+
+def _file_header(file_data: Union[bytes, bytearray, str, os.PathLike], size: int = 16) -> bytes:
+    """قراءة بداية الملف فقط عند تمرير مسار بدلاً من المحتوى الكامل"""
+    # المحتوى هو الحالة الشائعة وفحصه أسرع من فحص os.PathLike
+    if isinstance(file_data, (bytes, bytearray)):
+        return file_data
+    
+    with open(file_data, 'rb') as f:
+        return f.read(size)
+
+# قالب رسالة الإحصائيات (str.format_map يحلله في C دون نسخ القاموس)
+_STATS_MESSAGE = """
+📊 **إحصائياتك الشخصية**
+
+👤 **معلومات الحساب:**
+• رقم المستخدم: `{user_id}`
+• تاريخ الانضمام: {join_date}
+• نوع الحساب: {account_type}
+• آخر نشاط: {last_activity}
+
+📈 **إحصائيات الاستخدام:**
+• العمليات اليوم: **{daily_usage}** / **{daily_limit}**
+• إجمالي العمليات: **{total_operations:,}**
+• العمليات الناجحة: **{successful_operations:,}**
+• معدل النجاح: **{success_rate:.1f}%**
+
+📁 **إحصائيات الملفات:**
+• إجمالي الملفات المعالجة: **{files_processed:,}**
+• إجمالي البيانات المعالجة: **{data_processed}**
+• متوسط حجم الملف: **{avg_file_size}**
+
+🔥 **العمليات الأكثر استخداماً:**
+{top_operations}
+
+💾 **توفير المساحة:**
+• المساحة الموفرة من الضغط: **{space_saved}**
+• نسبة التوفير المتوسطة: **{avg_compression:.1f}%**
+"""
 
 class MessageFormatter:
     """منسق الرسائل المتقدم"""
@@ -70,14 +199,13 @@ class MessageFormatter:
         if size_bytes == 0:
             return "0 B"
         
-        size_names = ["B", "KB", "MB", "GB", "TB"]
         i = 0
         
-        while size_bytes >= 1024 and i < len(size_names) - 1:
+        while size_bytes >= 1024 and i < len(_SIZE_NAMES) - 1:
             size_bytes /= 1024.0
             i += 1
         
-        return f"{size_bytes:.1f} {size_names[i]}"
+        return f"{size_bytes:.1f} {_SIZE_NAMES[i]}"
     
     @staticmethod
     def format_duration(seconds: float) -> str:
@@ -95,10 +223,10 @@ class MessageFormatter:
     def create_progress_bar(current: int, total: int, length: int = 20) -> str:
         """إنشاء شريط تقدم"""
         if total == 0:
-            return "█" * length
+            return _progress_bar(length, length)
         
         filled_length = int(length * current // total)
-        bar = "█" * filled_length + "░" * (length - filled_length)
+        bar = _progress_bar(filled_length, length)
         percent = 100 * (current / float(total))
         
         return f"|{bar}| {percent:.1f}%"
@@ -106,76 +234,64 @@ class MessageFormatter:
     @staticmethod
     def create_stats_message(stats: Dict[str, Any]) -> str:
         """إنشاء رسالة الإحصائيات"""
-        message = """
-📊 **إحصائياتك الشخصية**
-
-👤 **معلومات الحساب:**
-• رقم المستخدم: `{user_id}`
-• تاريخ الانضمام: {join_date}
-• نوع الحساب: {account_type}
-• آخر نشاط: {last_activity}
-
-📈 **إحصائيات الاستخدام:**
-• العمليات اليوم: **{daily_usage}** / **{daily_limit}**
-• إجمالي العمليات: **{total_operations:,}**
-• العمليات الناجحة: **{successful_operations:,}**
-• معدل النجاح: **{success_rate:.1f}%**
-
-📁 **إحصائيات الملفات:**
-• إجمالي الملفات المعالجة: **{files_processed:,}**
-• إجمالي البيانات المعالجة: **{data_processed}**
-• متوسط حجم الملف: **{avg_file_size}**
-
-🔥 **العمليات الأكثر استخداماً:**
-{top_operations}
-
-💾 **توفير المساحة:**
-• المساحة الموفرة من الضغط: **{space_saved}**
-• نسبة التوفير المتوسطة: **{avg_compression:.1f}%**
-"""
-        
-        return message.format(**stats)
+        return _STATS_MESSAGE.format_map(stats)
 
 class ValidationHelper:
     """مساعد التحقق من صحة البيانات"""
     
     @staticmethod
-    def is_valid_pdf(file_data: bytes) -> bool:
-        """التحقق من صحة ملف PDF"""
-        return file_data.startswith(b'%PDF')
+    def is_valid_pdf(file_data: Union[bytes, str, os.PathLike]) -> bool:
+        """التحقق من صحة ملف PDF (محتوى الملف أو مساره)"""
+        return _file_header(file_data).startswith(b'%PDF')
     
     @staticmethod
-    def is_valid_image(file_data: bytes) -> bool:
-        """التحقق من صحة ملف الصورة"""
-        image_signatures = [
-            b'\xff\xd8\xff',      # JPEG
-            b'\x89PNG\r\n\x1a\n', # PNG
-            b'GIF87a',           # GIF
-            b'GIF89a',           # GIF
-            b'RIFF'              # WebP
-        ]
-        
-        for signature in image_signatures:
-            if file_data.startswith(signature):
-                return True
-        
-        return False
+    def is_valid_image(file_data: Union[bytes, str, os.PathLike]) -> bool:
+        """التحقق من صحة ملف الصورة (محتوى الملف أو مساره)"""
+        return _file_header(file_data).startswith(_IMAGE_SIGNATURES)
+    
+    @staticmethod
+    def detect_file_type(file_data: Union[bytes, bytearray, str, os.PathLike]) -> Optional[str]:
+        """تحديد نوع الملف (MIME) من توقيعه"""
+        header = _file_header(file_data)
+        
+        for length, signatures in _SIGNATURES_BY_LENGTH:
+            # bytearray غير قابل للتجزئة، لذا يُحوَّل الجزء المقطوع فقط إلى bytes
+            mime_type = signatures.get(bytes(header[:length]))
+            
+            # RIFF حاوية مشتركة (WAV وAVI أيضاً)، لذا يجب أن يتبعها WEBP في البايتات 8-12
+            if mime_type == 'image/webp' and header[8:12] != b'WEBP':
+                return None
+            
+            if mime_type:
+                return mime_type
+        
+        return None
     
     @staticmethod
     def validate_password(password: str) -> tuple[bool, str]:
         """التحقق من قوة كلمة المرور"""
-        if len(password) < 4:
-            return False, "كلمة المرور قصيرة جداً (الحد الأدنى 4 أحرف)"
+        length = len(password)
         
-        if len(password) > 128:
-            return False, "كلمة المرور طويلة جداً (الحد الأقصى 128 حرف)"
+        if 4 <= length <= 128:
+            return _PASSWORD_RESULTS[0]
         
-        return True, "كلمة مرور صحيحة"
+        return _PASSWORD_RESULTS[1 if length < 4 else 2]
+
+class _LazyJSON:
+    """تحويل البيانات إلى JSON فقط عند كتابة رسالة السجل فعلياً"""
+    
+    __slots__ = ('data',)
+    
+    def __init__(self, data: Any):
+        self.data = data
+    
+    def __str__(self) -> str:
+        return orjson.dumps(self.data, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS, default=str).decode()
 
 class ErrorHandler:
     """معالج الأخطاء المتقدم"""
     
-    ERROR_MESSAGES = {
+    ERROR_MESSAGES = MappingProxyType({
         'file_too_large': '❌ حجم الملف كبير جداً! الحد الأقصى {max_size}',
         'invalid_file_type': '❌ نوع الملف غير مدعوم! الأنواع المدعومة: {supported_types}',
         'daily_limit_exceeded': '⏰ تم تجاوز الحد اليومي ({limit} عملية). يرجى المحاولة غداً!',
@@ -184,7 +300,7 @@ class ErrorHandler:
         'database_error': '💾 خطأ في قاعدة البيانات. يرجى المحاولة لاحقاً.',
         'permission_denied': '🚫 ليس لديك صلاحية لتنفيذ هذا الأمر.',
         'maintenance_mode': '🔧 البوت في وضع الصيانة. يرجى المحاولة لاحقاً.'
-    }
+    })
     
     @classmethod
     def get_error_message(cls, error_type: str, **kwargs) -> str:
@@ -202,7 +318,7 @@ class ErrorHandler:
             'context': context or {}
         }
         
-        logger.error(f"خطأ في البوت: {json.dumps(error_data, ensure_ascii=False, indent=2)}")
+        logger.error("خطأ في البوت: %s", _LazyJSON(error_data))
 
 class PerformanceMonitor:
     """مراقب الأداء"""